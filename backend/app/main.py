@@ -3,8 +3,9 @@ from __future__ import annotations
 import os
 from typing import List
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlmodel import select
 
@@ -12,10 +13,25 @@ from . import auth
 from .database import get_session, init_db
 from .llm import get_llm_client
 from .models import ChatMessage, User
+from .profiling import ProfiledRoute, ProfilingMiddleware, SamplingProfiler, SlowRequestLog, stage
 from .rag import get_knowledge_base
-from .schemas import ChatHistoryItem, ChatRequest, ChatResponse, Token, UserCreate, UserRead
+from .responses import FastJSONResponse
+from .schemas import (
+    ChatHistoryItem,
+    ChatRequest,
+    ChatResponse,
+    ProfilerStartRequest,
+    ProfilerStatus,
+    SlowRequestConfig,
+    SlowRequestRecord,
+    Token,
+    UserCreate,
+    UserRead,
+)
 
 app = FastAPI(title="Migraine RAG Assistant for Teens")
+# Lets the on-demand profiler sample the thread running each endpoint.
+app.router.route_class = ProfiledRoute
 
 origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
 app.add_middleware(
@@ -26,6 +42,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+admin_emails = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+profiler = SamplingProfiler()
+slow_requests = SlowRequestLog.from_env()
+app.add_middleware(ProfilingMiddleware, profiler=profiler, slow_requests=slow_requests)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
@@ -49,7 +71,7 @@ def register_user(payload: UserCreate):
         session.add(user)
         session.commit()
         session.refresh(user)
-        return UserRead(
+        return UserRead.model_construct(
             id=user.id,
             email=user.email,
             full_name=user.full_name,
@@ -64,21 +86,24 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
         if not user or not auth.verify_password(form_data.password, user.hashed_password):
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         token = auth.create_access_token(str(user.id))
-        return Token(access_token=token)
+        return Token.model_construct(access_token=token)
 
 
 @app.get("/auth/me", response_model=UserRead)
 def read_current_user(token: str = Depends(oauth2_scheme)):
     user = _get_user_from_token(token)
-    return UserRead(id=user.id, email=user.email, full_name=user.full_name, created_at=user.created_at)
+    return UserRead.model_construct(
+        id=user.id, email=user.email, full_name=user.full_name, created_at=user.created_at
+    )
 
 
 def _get_user_from_token(token: str) -> User:
     try:
-        token_payload = auth.decode_access_token(token)
+        with stage("auth.decode_token"):
+            token_payload = auth.decode_access_token(token)
     except ValueError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    with get_session() as session:
+    with stage("auth.load_user"), get_session() as session:
         user = session.get(User, int(token_payload.sub))
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
@@ -89,23 +114,22 @@ def _get_user_from_token(token: str) -> User:
 def ask_question(request: ChatRequest, token: str = Depends(oauth2_scheme)):
     user = _get_user_from_token(token)
 
-    kb = get_knowledge_base()
-    results = kb.query(request.question)
-    context_entries = [
-        {"title": doc["title"], "content": doc["content"], "score": score}
-        for doc, score in results
-    ]
-    context_chunks = [entry["content"] for entry in context_entries]
+    with stage("rag.retrieve"):
+        kb = get_knowledge_base()
+        context = kb.context_snippets(request.question)
+    context_chunks = [snippet.content for snippet in context]
 
-    llm_client = get_llm_client()
-    answer = llm_client.generate(request.question, context_chunks)
+    with stage("llm.generate"):
+        llm_client = get_llm_client()
+        answer = llm_client.generate(request.question, context_chunks)
 
-    with get_session() as session:
+    with stage("db.save_message"), get_session() as session:
         message = ChatMessage(user_id=user.id, question=request.question, answer=answer)
         session.add(message)
         session.commit()
 
-    return ChatResponse(answer=answer, context=context_entries)
+    # Built from trusted index data, so skip FastAPI's response re-validation.
+    return FastJSONResponse(ChatResponse.model_construct(answer=answer, context=context))
 
 
 @app.get("/chat/history", response_model=List[ChatHistoryItem])
@@ -114,7 +138,67 @@ def get_history(token: str = Depends(oauth2_scheme)):
     with get_session() as session:
         statement = select(ChatMessage).where(ChatMessage.user_id == user.id).order_by(ChatMessage.created_at.desc())
         records = session.exec(statement).all()
-    return [
-        ChatHistoryItem(id=item.id, question=item.question, answer=item.answer, created_at=item.created_at)
-        for item in records
-    ]
+    return FastJSONResponse(
+        [
+            ChatHistoryItem.model_construct(
+                id=item.id, question=item.question, answer=item.answer, created_at=item.created_at
+            )
+            for item in records
+        ]
+    )
+
+
+def _get_admin_user(token: str) -> User:
+    user = _get_user_from_token(token)
+    if user.email.lower() not in admin_emails:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return user
+
+
+@app.post("/admin/profiler/start", response_model=ProfilerStatus)
+def start_profiler(payload: ProfilerStartRequest, token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    profiler.start(payload.duration_seconds, sample_rate=payload.sample_rate, interval_ms=payload.interval_ms)
+    return ProfilerStatus(**profiler.status())
+
+
+@app.post("/admin/profiler/stop", response_model=ProfilerStatus)
+def stop_profiler(token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    profiler.stop()
+    return ProfilerStatus(**profiler.status())
+
+
+@app.get("/admin/profiler", response_model=ProfilerStatus)
+def get_profiler_status(token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    return ProfilerStatus(**profiler.status())
+
+
+@app.get("/admin/profiler/collapsed", response_class=PlainTextResponse)
+def download_profile(token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
+
+@app.get("/admin/slow-requests", response_model=List[SlowRequestRecord])
+def get_slow_requests(token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    return [SlowRequestRecord(**record) for record in slow_requests.records()]
+
+
+@app.put("/admin/slow-requests/config", response_model=SlowRequestConfig)
+def configure_slow_requests(payload: SlowRequestConfig, token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    slow_requests.configure(payload.threshold_ms, payload.capacity)
+    return SlowRequestConfig(threshold_ms=slow_requests.threshold_ms, capacity=slow_requests.capacity)
+
+
+@app.delete("/admin/slow-requests", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_requests(token: str = Depends(oauth2_scheme)):
+    _get_admin_user(token)
+    slow_requests.clear()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,388 @@
+"""On-demand sampling profiler and slow-request capture.
+
+Handlers mark the interesting parts of a request with :func:`stage`. When
+neither feature is switched on, :class:`ProfilingMiddleware` passes requests
+straight through and :func:`stage` returns a shared no-op context manager, so
+the instrumentation costs a context-variable lookup per stage.
+
+* :class:`SamplingProfiler` periodically samples the Python stacks of threads
+  running the endpoints of selected requests and aggregates them into the
+  collapsed format read by ``flamegraph.pl`` and speedscope
+  (``frame;frame;frame count``). Routes opt in through
+  :class:`ProfiledRoute`, which registers the endpoint's thread for exactly
+  as long as the endpoint runs.
+* :class:`SlowRequestLog` keeps the per-stage breakdown of requests slower
+  than a latency threshold in a bounded ring buffer.
+
+Environment variables:
+
+* ``SLOW_REQUEST_THRESHOLD_MS`` – capture requests slower than this many
+  milliseconds (disabled when unset).
+* ``SLOW_REQUEST_BUFFER_SIZE`` – number of captured requests to keep
+  (defaults to 100).
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Deque, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+DEFAULT_SAMPLE_INTERVAL_MS = 5.0
+DEFAULT_SLOW_REQUEST_BUFFER_SIZE = 100
+# Distinct stacks beyond this are counted under a single placeholder frame.
+MAX_DISTINCT_STACKS = 10_000
+TRUNCATED_STACK = "[other stacks]"
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+_NULL_STAGE = nullcontext()
+
+
+class RequestTrace:
+    """Timing information collected while serving one request."""
+
+    def __init__(self, method: str, path: str, profiler: Optional["SamplingProfiler"] = None):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.start = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        # Set when the request was selected for sampling.
+        self.profiler = profiler
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+
+class _Stage:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        end = time.perf_counter()
+        self.trace.stages.append(
+            {
+                "name": self.name,
+                "start_ms": round((self.start - self.trace.start) * 1000, 3),
+                "duration_ms": round((end - self.start) * 1000, 3),
+            }
+        )
+
+
+def stage(name: str) -> ContextManager[None]:
+    """Time the enclosed block as ``name`` within the current request trace."""
+
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_STAGE
+    return _Stage(trace, name)
+
+
+@contextmanager
+def _sampled_thread(profiler: "SamplingProfiler") -> Iterator[None]:
+    ident = threading.get_ident()
+    profiler.add_thread(ident)
+    try:
+        yield
+    finally:
+        profiler.remove_thread(ident)
+
+
+def endpoint_scope() -> ContextManager[None]:
+    """Expose the calling thread to the profiler if this request is sampled.
+
+    Enter it in the thread that runs the endpoint so the thread is released
+    as soon as the endpoint returns, before it can serve another request.
+    """
+
+    trace = _current_trace.get()
+    if trace is None or trace.profiler is None:
+        return _NULL_STAGE
+    return _sampled_thread(trace.profiler)
+
+
+def _profiled(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # Async endpoints share the event loop thread with other requests,
+            # so their samples can include unrelated work.
+            with endpoint_scope():
+                return await endpoint(*args, **kwargs)
+
+    else:
+
+        @functools.wraps(endpoint)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with endpoint_scope():
+                return endpoint(*args, **kwargs)
+
+    # FastAPI resolves string annotations against the wrapper's globals, so
+    # hand it the endpoint's signature with annotations already evaluated.
+    wrapper.__signature__ = inspect.signature(endpoint, eval_str=True)  # type: ignore[attr-defined]
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route whose endpoint runs inside :func:`endpoint_scope`.
+
+    FastAPI reads the endpoint signature through ``functools.wraps``, so the
+    wrapped endpoint keeps its parameters and dependencies. Body parsing,
+    validation and async dependencies run on the event loop before the
+    endpoint starts and are not sampled.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+
+def _frame_label(frame: Any) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """Background sampler that aggregates stacks of request-serving threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # Serialises start/stop so only one sampler thread ever exists.
+        self._control_lock = threading.Lock()
+        self._threads: Counter = Counter()
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.sample_rate = 0.0
+        self.interval_ms = DEFAULT_SAMPLE_INTERVAL_MS
+        self.started_at: Optional[datetime] = None
+        self.deadline: Optional[float] = None
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(
+        self, duration_seconds: float, sample_rate: float = 1.0, interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS
+    ) -> None:
+        """Start sampling for ``duration_seconds``, discarding earlier results.
+
+        ``sample_rate`` is the fraction of requests whose threads are sampled.
+        """
+
+        with self._control_lock:
+            self._stop_sampler()
+            with self._lock:
+                self._stacks.clear()
+                self.samples = 0
+            self.sample_rate = sample_rate
+            self.interval_ms = interval_ms
+            self.started_at = datetime.utcnow()
+            self.deadline = time.monotonic() + duration_seconds
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._control_lock:
+            self._stop_sampler()
+
+    def _stop_sampler(self) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self._thread = None
+        self.deadline = None
+
+    def should_sample(self) -> bool:
+        """Decide whether the next request's threads should be sampled."""
+
+        return self.running and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] += 1
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def _run(self) -> None:
+        interval = self.interval_ms / 1000
+        while not self._stop.wait(interval):
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                break
+            self._sample()
+
+    def _sample(self) -> None:
+        with self._lock:
+            idents = list(self._threads)
+        if not idents:
+            return
+        frames = sys._current_frames()
+        collected = []
+        for ident in idents:
+            frame = frames.get(ident)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                collected.append(";".join(reversed(labels)))
+        with self._lock:
+            for collapsed in collected:
+                if collapsed not in self._stacks and len(self._stacks) >= MAX_DISTINCT_STACKS:
+                    collapsed = TRUNCATED_STACK
+                self._stacks[collapsed] += 1
+            self.samples += len(collected)
+
+    def collapsed(self) -> str:
+        """Return aggregated stacks as ``frame;frame;frame count`` lines."""
+
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{collapsed} {count}\n" for collapsed, count in stacks)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            distinct = len(self._stacks)
+        remaining = None
+        if self.running and self.deadline is not None:
+            remaining = max(self.deadline - time.monotonic(), 0.0)
+        return {
+            "running": self.running,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval_ms,
+            "started_at": self.started_at,
+            "remaining_seconds": remaining,
+            "samples": self.samples,
+            "distinct_stacks": distinct,
+        }
+
+
+def _env_threshold() -> Optional[float]:
+    value = os.getenv("SLOW_REQUEST_THRESHOLD_MS")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError as exc:
+        raise ValueError("SLOW_REQUEST_THRESHOLD_MS environment variable must be a number") from exc
+
+
+def _env_capacity() -> int:
+    value = os.getenv("SLOW_REQUEST_BUFFER_SIZE")
+    if not value:
+        return DEFAULT_SLOW_REQUEST_BUFFER_SIZE
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise ValueError("SLOW_REQUEST_BUFFER_SIZE environment variable must be an integer") from exc
+
+
+class SlowRequestLog:
+    """Ring buffer of per-stage breakdowns for requests over a threshold."""
+
+    def __init__(self, threshold_ms: Optional[float] = None, capacity: int = DEFAULT_SLOW_REQUEST_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self.threshold_ms = threshold_ms
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+
+    @classmethod
+    def from_env(cls) -> "SlowRequestLog":
+        return cls(threshold_ms=_env_threshold(), capacity=_env_capacity())
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms is not None
+
+    @property
+    def capacity(self) -> int:
+        return self._records.maxlen or 0
+
+    def configure(self, threshold_ms: Optional[float], capacity: int) -> None:
+        with self._lock:
+            self.threshold_ms = threshold_ms
+            if capacity != self._records.maxlen:
+                self._records = deque(self._records, maxlen=capacity)
+
+    def record(self, trace: RequestTrace, status_code: Optional[int], duration_ms: float) -> None:
+        threshold = self.threshold_ms
+        if threshold is None or duration_ms < threshold:
+            return
+        entry = {
+            "method": trace.method,
+            "path": trace.path,
+            "status_code": status_code,
+            "started_at": trace.started_at,
+            "duration_ms": round(duration_ms, 3),
+            "stages": list(trace.stages),
+        }
+        with self._lock:
+            self._records.append(entry)
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that attaches a :class:`RequestTrace` when needed."""
+
+    def __init__(self, app: ASGIApp, profiler: SamplingProfiler, slow_requests: SlowRequestLog) -> None:
+        self.app = app
+        self.profiler = profiler
+        self.slow_requests = slow_requests
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = self.profiler.should_sample()
+        if not sampled and not self.slow_requests.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"], self.profiler if sampled else None)
+        status_code: Optional[int] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _current_trace.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            self.slow_requests.record(trace, status_code, trace.elapsed_ms())
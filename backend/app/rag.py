@@ -8,6 +8,9 @@ from typing import List, Tuple
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+from .schemas import ContextSnippet
+from .serialization import encode_snippet_prefix
+
 DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "migraine_articles.json"
 
 
@@ -17,16 +20,30 @@ class KnowledgeBase:
         self.vectorizer = TfidfVectorizer(stop_words="english")
         self.document_texts = [doc["content"] for doc in documents]
         self.doc_vectors = self.vectorizer.fit_transform(self.document_texts)
+        self.snippet_prefixes = [encode_snippet_prefix(doc["title"], doc["content"]) for doc in documents]
 
-    def query(self, question: str, top_k: int = 3) -> List[Tuple[dict, float]]:
+    def _rank(self, question: str, top_k: int) -> List[Tuple[int, float]]:
         question_vec = self.vectorizer.transform([question])
         similarities = cosine_similarity(question_vec, self.doc_vectors).flatten()
         ranked_indices = similarities.argsort()[::-1][:top_k]
-        results: List[Tuple[dict, float]] = []
-        for idx in ranked_indices:
-            score = max(float(similarities[idx]), 0.0)
-            results.append((self.documents[idx], score))
-        return results
+        return [(int(idx), max(float(similarities[idx]), 0.0)) for idx in ranked_indices]
+
+    def query(self, question: str, top_k: int = 3) -> List[Tuple[dict, float]]:
+        return [(self.documents[idx], score) for idx, score in self._rank(question, top_k)]
+
+    def context_snippets(self, question: str, top_k: int = 3) -> List[ContextSnippet]:
+        """Return the top matches as response-ready snippets.
+
+        Snippets are constructed without validation and carry the JSON
+        fragment cached for their document at index time.
+        """
+        snippets: List[ContextSnippet] = []
+        for idx, score in self._rank(question, top_k):
+            doc = self.documents[idx]
+            snippet = ContextSnippet.model_construct(title=doc["title"], content=doc["content"], score=score)
+            snippet._json_prefix = (doc["title"], doc["content"], self.snippet_prefixes[idx])
+            snippets.append(snippet)
+        return snippets
 
 
 @lru_cache(maxsize=1)
@@ -0,0 +1,22 @@
+"""Opt-in fast JSON response class.
+
+FastAPI re-validates whatever a route returns against its ``response_model``
+before encoding it. Routes whose payloads are built entirely from trusted
+response schemas can return :class:`FastJSONResponse` instead, which FastAPI
+passes through untouched. The declared ``response_model`` still documents the
+route in the OpenAPI schema.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from .serialization import encode
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with :func:`backend.app.serialization.encode`."""
+
+    def render(self, content: Any) -> bytes:
+        return encode(content)
@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Optional, Tuple
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, PrivateAttr
 
 
 class UserCreate(BaseModel):
@@ -37,6 +38,11 @@ class ContextSnippet(BaseModel):
     content: str
     score: float
 
+    # ``(title, content, prefix)`` where ``prefix`` is the pre-encoded
+    # ``{"title":...,"content":...,"score":`` fragment cached by the knowledge
+    # base; see ``serialization.encode_snippet_prefix``.
+    _json_prefix: Optional[Tuple[str, str, bytes]] = PrivateAttr(default=None)
+
 
 class ChatResponse(BaseModel):
     answer: str
@@ -53,3 +59,39 @@ class ChatHistoryItem(BaseModel):
 class AuthResponse(BaseModel):
     user: UserRead
     token: Token
+
+
+class ProfilerStartRequest(BaseModel):
+    duration_seconds: float = Field(default=30.0, gt=0, le=3600)
+    sample_rate: float = Field(default=1.0, gt=0, le=1)
+    interval_ms: float = Field(default=5.0, ge=1, le=1000)
+
+
+class ProfilerStatus(BaseModel):
+    running: bool
+    sample_rate: float
+    interval_ms: float
+    started_at: Optional[datetime] = None
+    remaining_seconds: Optional[float] = None
+    samples: int
+    distinct_stacks: int
+
+
+class SlowRequestConfig(BaseModel):
+    threshold_ms: Optional[float] = Field(default=None, ge=0)
+    capacity: int = Field(default=100, ge=1, le=10000)
+
+
+class StageTiming(BaseModel):
+    name: str
+    start_ms: float
+    duration_ms: float
+
+
+class SlowRequestRecord(BaseModel):
+    method: str
+    path: str
+    status_code: Optional[int] = None
+    started_at: datetime
+    duration_ms: float
+    stages: list[StageTiming]
@@ -0,0 +1,85 @@
+"""Fast JSON encoding for trusted API payloads.
+
+Response models are encoded with pydantic's compiled serializers, skipping
+the validation FastAPI would otherwise repeat. Context snippets splice in the
+JSON prefix cached for each document when the knowledge base is built instead
+of re-encoding the article content on every request; the remaining scalars
+are encoded with ``orjson`` when it is installed and with
+:func:`pydantic_core.to_json` otherwise. This module has no web framework
+dependency; see :mod:`backend.app.responses` for the response class built on
+it.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, List, Type
+
+import pydantic_core
+from pydantic import BaseModel, TypeAdapter
+
+from .schemas import ChatHistoryItem, ChatResponse, ContextSnippet
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None  # type: ignore
+
+
+def dumps(value: Any) -> bytes:
+    """Encode ``value`` as compact UTF-8 JSON."""
+
+    if orjson is not None:
+        return orjson.dumps(value)
+    return pydantic_core.to_json(value)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])  # type: ignore[valid-type]
+
+
+# Built up front for the hot ``/chat/history`` path.
+_list_adapter(ChatHistoryItem)
+
+
+def encode_snippet_prefix(title: str, content: str) -> bytes:
+    """Return the JSON for a context snippet up to its score.
+
+    The result is ``{"title":...,"content":...,"score":`` so that a response
+    only has to append the query-specific score and the closing brace.
+    """
+
+    encoded = dumps({"title": title, "content": content})
+    return encoded[:-1] + b',"score":'
+
+
+def _encode_snippet(snippet: ContextSnippet) -> bytes:
+    cached = snippet._json_prefix
+    # Only trust the cached prefix while the snippet still holds the exact
+    # strings it was built from; copies with updated fields fall back.
+    if cached is not None and cached[0] is snippet.title and cached[1] is snippet.content:
+        return cached[2] + dumps(snippet.score) + b"}"
+    return snippet.__pydantic_serializer__.to_json(snippet)
+
+
+def _encode_chat_response(response: ChatResponse) -> bytes:
+    snippets = b",".join(_encode_snippet(snippet) for snippet in response.context)
+    return b'{"answer":' + dumps(response.answer) + b',"context":[' + snippets + b"]}"
+
+
+def encode(content: Any) -> bytes:
+    """Encode a response model, a list of response models, or plain data.
+
+    Models are dumped as-is, so only pass the response schemas from
+    :mod:`backend.app.schemas`, never ORM objects.
+    """
+
+    if isinstance(content, ChatResponse):
+        return _encode_chat_response(content)
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if isinstance(content, (list, tuple)) and content:
+        model = type(content[0])
+        if issubclass(model, BaseModel) and all(type(item) is model for item in content):
+            return _list_adapter(model).dump_json(list(content))
+    return pydantic_core.to_json(content)
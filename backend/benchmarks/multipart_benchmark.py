@@ -0,0 +1,102 @@
+"""Compare the bundled ``multipart`` header parser with the ``email`` based one.
+
+Run from the repository root::
+
+    python -m backend.benchmarks.multipart_benchmark
+
+:func:`email_parse_options_header` is the previous implementation, which
+built an :class:`email.message.Message` for every call; it lives with
+the conformance tests in ``backend/tests/multipart_reference.py``. The
+benchmark also streams a large ``multipart/form-data`` body through
+:class:`multipart.MultipartParser` and reports the largest buffer it held.
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from backend.tests.multipart_reference import email_parse_options_header
+from multipart import MultipartParser, parse_options_header
+from multipart.multipart import _parse_options_header
+
+HEADERS = [
+    "application/x-www-form-urlencoded",
+    "multipart/form-data; boundary=----WebKitFormBoundary7MA4YWxkTrZu0gW",
+    'form-data; name="diary"; filename="headache-diary.csv"',
+    "text/plain; charset=UTF-8",
+    "attachment; filename*=UTF-8''%E2%82%AC%20rates.csv",
+]
+
+
+def _uncached_parse_options_header(value: str):
+    primary, options = _parse_options_header.__wrapped__(value.strip())
+    return primary, dict(options)
+
+
+def _bench_headers(number: int) -> None:
+    cases = [
+        ("email (previous)", email_parse_options_header),
+        ("single-pass", _uncached_parse_options_header),
+        ("single-pass+memo", parse_options_header),
+    ]
+    for header in HEADERS:
+        assert email_parse_options_header(header) == parse_options_header(header), header
+
+    print(f"parse_options_header, {len(HEADERS)} headers x {number}")
+    baseline = None
+    for name, func in cases:
+        elapsed = min(
+            timeit.repeat(lambda: [func(header) for header in HEADERS], number=number, repeat=3)
+        )
+        per_call = elapsed / (number * len(HEADERS))
+        baseline = baseline or per_call
+        print(f"  {name:<18}{per_call * 1e6:>8.2f} us/call {baseline / per_call:>6.1f}x")
+
+
+def _bench_streaming(body_mb: int, chunk_size: int) -> None:
+    boundary = b"----diaryboundary"
+    row = b"2024-05-01,7,skipped breakfast,ibuprofen\r\n"
+    payload = row * (body_mb * 1024 * 1024 // len(row))
+    body = (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="diary"; filename="diary.csv"\r\n'
+        b"Content-Type: text/csv\r\n\r\n" + payload + b"\r\n--" + boundary + b"--\r\n"
+    )
+
+    received = 0
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        nonlocal received
+        received += end - start
+
+    def run() -> int:
+        nonlocal received
+        received = 0
+        parser = MultipartParser(boundary, {"on_part_data": on_part_data})
+        peak = 0
+        for offset in range(0, len(body), chunk_size):
+            parser.write(body[offset : offset + chunk_size])
+            peak = max(peak, len(parser._buffer))
+        parser.finalize()
+        assert received == len(payload)
+        return peak
+
+    peak = run()
+    elapsed = min(timeit.repeat(run, number=1, repeat=3))
+    print(f"MultipartParser, {len(body) / 1e6:.1f} MB body in {chunk_size} byte chunks")
+    print(f"  {len(body) / elapsed / 1e6:.1f} MB/s, peak buffered between writes: {peak} bytes")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="iterations over the header set")
+    parser.add_argument("--body-mb", type=int, default=16, help="size of the streamed multipart body")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024, help="bytes per write")
+    args = parser.parse_args()
+
+    _bench_headers(args.number)
+    _bench_streaming(args.body_mb, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
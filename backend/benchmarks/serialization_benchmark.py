@@ -0,0 +1,111 @@
+"""Compare the default FastAPI response path with the fast JSON path.
+
+Run from the repository root::
+
+    python -m backend.benchmarks.serialization_benchmark
+
+The "default" column mirrors what FastAPI does for a route with a
+``response_model``: dump the returned model, re-validate it, serialize it in
+JSON mode and render it with :class:`fastapi.responses.JSONResponse`. The
+"fast" column renders the same value with
+:class:`backend.app.responses.FastJSONResponse`, once with ``orjson`` and once
+with pydantic's serializer alone (``--encoder`` picks one).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import timeit
+from datetime import datetime
+from typing import Any, Callable, List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from backend.app import serialization
+from backend.app.responses import FastJSONResponse
+from backend.app.rag import KnowledgeBase, get_knowledge_base
+from backend.app.schemas import ChatHistoryItem, ChatResponse
+
+
+def _default_path(adapter: TypeAdapter, value: Any) -> Callable[[], bytes]:
+    def run() -> bytes:
+        if isinstance(value, list):
+            content = [item.model_dump() for item in value]
+        else:
+            content = value.model_dump()
+        validated = adapter.validate_python(content)
+        return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+    return run
+
+
+def _fast_path(value: Any) -> Callable[[], bytes]:
+    return lambda: FastJSONResponse(value).body
+
+
+def _chat_response(kb: KnowledgeBase) -> ChatResponse:
+    snippets = kb.context_snippets("What can I do about migraine triggers and sleep?", top_k=len(kb.documents))
+    answer = " ".join(snippet.content for snippet in snippets)
+    return ChatResponse.model_construct(answer=answer, context=snippets)
+
+
+def _history(size: int) -> List[ChatHistoryItem]:
+    now = datetime.utcnow()
+    return [
+        ChatHistoryItem.model_construct(
+            id=idx, question=f"Question {idx}?", answer="Drink water and rest. " * 40, created_at=now
+        )
+        for idx in range(size)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=2000, help="iterations per case")
+    parser.add_argument("--snippet-scale", type=int, default=20, help="repeat article content this many times")
+    parser.add_argument("--history-size", type=int, default=200, help="chat history rows")
+    parser.add_argument(
+        "--encoder", choices=["both", "orjson", "pydantic"], default="both", help="scalar encoder for the fast path"
+    )
+    args = parser.parse_args()
+
+    documents = [
+        {"title": doc["title"], "content": " ".join([doc["content"]] * args.snippet_scale)}
+        for doc in get_knowledge_base().documents
+    ]
+    kb = KnowledgeBase(documents)
+
+    cases = [
+        ("chat/query", TypeAdapter(ChatResponse), _chat_response(kb)),
+        ("chat/history", TypeAdapter(List[ChatHistoryItem]), _history(args.history_size)),
+    ]
+
+    encoders = ["orjson", "pydantic"] if args.encoder == "both" else [args.encoder]
+    if serialization.orjson is None and "orjson" in encoders:
+        print("orjson is not installed; skipping the orjson run")
+        encoders.remove("orjson")
+
+    installed = serialization.orjson
+    try:
+        for encoder in encoders:
+            serialization.orjson = installed if encoder == "orjson" else None
+            _bench_cases(encoder, cases, args.number)
+    finally:
+        serialization.orjson = installed
+
+
+def _bench_cases(encoder: str, cases: List[Any], number: int) -> None:
+    print(f"encoder={encoder} number={number}")
+    print(f"{'case':<14}{'default (us)':>14}{'fast (us)':>12}{'speedup':>10}")
+    for name, adapter, value in cases:
+        default = _default_path(adapter, value)
+        fast = _fast_path(value)
+        # Float formatting differs between encoders ("1e-05" vs "0.00001").
+        assert json.loads(default()) == json.loads(fast()), f"{name}: fast path output differs"
+        default_time = min(timeit.repeat(default, number=number, repeat=3)) / number
+        fast_time = min(timeit.repeat(fast, number=number, repeat=3)) / number
+        print(f"{name:<14}{default_time * 1e6:>14.1f}{fast_time * 1e6:>12.1f}{default_time / fast_time:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
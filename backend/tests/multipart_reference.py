@@ -0,0 +1,38 @@
+"""Reference ``parse_options_header`` for the multipart conformance tests.
+
+This is the previous implementation of :func:`multipart.parse_options_header`,
+which built an :class:`email.message.Message` for every call. The tests and
+``backend/benchmarks/multipart_benchmark.py`` compare the current parser
+against it.
+"""
+from email.message import Message
+from email.utils import collapse_rfc2231_value
+from typing import Dict, Tuple
+
+
+def email_parse_options_header(value) -> Tuple[str, Dict[str, str]]:
+    """Previous ``parse_options_header`` implementation built on :mod:`email`."""
+
+    if value is None:
+        return "", {}
+    if isinstance(value, bytes):
+        value = value.decode("latin-1", "ignore")
+    value = value.strip()
+    if not value:
+        return "", {}
+
+    message = Message()
+    message["content-type"] = value
+    params = message.get_params(header="content-type", failobj=[])
+    if not params:
+        return value.lower(), {}
+
+    primary = params[0][0].strip().lower()
+    options: Dict[str, str] = {}
+    for key, raw_val in params[1:]:
+        key_lower = key.strip().lower()
+        if isinstance(raw_val, tuple):
+            options[key_lower] = collapse_rfc2231_value(raw_val)
+        else:
+            options[key_lower] = raw_val
+    return primary, options
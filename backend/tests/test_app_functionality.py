@@ -1,14 +1,19 @@
+import asyncio
 from contextlib import contextmanager
+from datetime import datetime
+import json
 import sys
 from pathlib import Path
 
 import pytest
 from fastapi import HTTPException
+from sqlalchemy.pool import StaticPool
 from sqlmodel import SQLModel, Session, create_engine
 
 sys.path.append(str(Path(__file__).resolve().parents[2]))
 
-from backend.app import main, schemas  # noqa: E402
+from backend.app import main, schemas, serialization  # noqa: E402
+from backend.app.rag import KnowledgeBase  # noqa: E402
 
 
 class DummyForm:
@@ -31,6 +36,12 @@ class DummyKnowledgeBase:
         ]
         return [(doc, 0.9 - idx * 0.1) for idx, doc in enumerate(documents[:top_k])]
 
+    def context_snippets(self, question: str, top_k: int = 3):
+        return [
+            schemas.ContextSnippet(title=doc["title"], content=doc["content"], score=score)
+            for doc, score in self.query(question, top_k)
+        ]
+
 
 class DummyLLM:
     def generate(self, question: str, context_chunks: list[str]) -> str:
@@ -43,7 +54,9 @@ class DummyLLM:
 
 @pytest.fixture
 def app_dependencies(monkeypatch):
-    engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+    # ``StaticPool`` shares the in-memory database with the threadpool that
+    # serves requests in the ASGI-level tests.
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
     SQLModel.metadata.create_all(engine)
 
     @contextmanager
@@ -86,6 +99,37 @@ def _register_user(email: str = "teen@example.com", password: str = "StrongPass1
     return main.register_user(payload)
 
 
+def _asgi_request(method: str, path: str, body: bytes = b"", headers: dict | None = None):
+    """Send one request through the full ASGI app and return ``(status, body)``."""
+
+    messages = []
+    request = {"type": "http.request", "body": body, "more_body": False}
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return request
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(main.app(scope, receive, send))
+    status_code = next(message["status"] for message in messages if message["type"] == "http.response.start")
+    return status_code, b"".join(message.get("body", b"") for message in messages[1:])
+
+
 def _login_user(email: str = "teen@example.com", password: str = "StrongPass123"):
     form = DummyForm(username=email, password=password)
     return main.login(form)
@@ -104,15 +148,39 @@ def test_full_auth_chat_flow(app_dependencies):
     assert me.full_name == "Test Teen"
 
     chat_request = schemas.ChatRequest(question="What helps with migraine triggers?")
-    chat_response = main.ask_question(chat_request, token=login_token.access_token)
-    assert "Always talk with a healthcare professional" in chat_response.answer
-    assert len(chat_response.context) == 2
-    assert chat_response.context[0].title == "Hydration Tips"
+    chat_response = json.loads(main.ask_question(chat_request, token=login_token.access_token).body)
+    assert "Always talk with a healthcare professional" in chat_response["answer"]
+    assert len(chat_response["context"]) == 2
+    assert chat_response["context"][0]["title"] == "Hydration Tips"
 
-    history = main.get_history(token=login_token.access_token)
+    history = json.loads(main.get_history(token=login_token.access_token).body)
     assert len(history) == 1
-    assert history[0].question == chat_request.question
-    assert history[0].answer == chat_response.answer
+    assert history[0]["question"] == chat_request.question
+    assert history[0]["answer"] == chat_response["answer"]
+
+
+def test_http_routes_encode_responses(app_dependencies):
+    _register_user()
+    headers = {"Authorization": "Bearer token::1", "Content-Type": "application/json"}
+
+    status_code, body = _asgi_request("GET", "/auth/me", headers=headers)
+    assert status_code == 200
+    assert json.loads(body)["email"] == "teen@example.com"
+    assert b"hashed" not in body
+
+    question = json.dumps({"question": "How do I spot triggers?"}).encode()
+    status_code, body = _asgi_request("POST", "/chat/query", body=question, headers=headers)
+    assert status_code == 200
+    chat_response = json.loads(body)
+    assert [snippet["title"] for snippet in chat_response["context"]] == ["Hydration Tips", "Identifying Triggers"]
+    assert chat_response["context"][1]["score"] == pytest.approx(0.8)
+
+    status_code, body = _asgi_request("GET", "/chat/history", headers=headers)
+    assert status_code == 200
+    assert [item["answer"] for item in json.loads(body)] == [chat_response["answer"]]
+
+    status_code, _ = _asgi_request("GET", "/chat/history", headers={"Authorization": "Bearer nope"})
+    assert status_code == 401
 
 
 def test_duplicate_registration_rejected(app_dependencies):
@@ -123,3 +191,46 @@ def test_duplicate_registration_rejected(app_dependencies):
         _register_user()
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "Email already registered"
+
+
+def test_fast_json_encoding_matches_pydantic():
+    documents = [
+        {"title": "Hydration Tips", "content": "Drink plenty of water \u2014 \"small sips\" help."},
+        {"title": "Sleep", "content": "Keep a regular sleep schedule to reduce migraine days."},
+    ]
+    kb = KnowledgeBase(documents)
+    snippets = kb.context_snippets("water sleep", top_k=2)
+    assert all(snippet._json_prefix is not None for snippet in snippets)
+
+    response = schemas.ChatResponse.model_construct(answer="Stay hydrated.", context=snippets)
+    expected = schemas.ChatResponse.model_validate(response.model_dump()).model_dump(mode="json")
+    assert json.loads(serialization.encode(response)) == expected
+
+    edited = snippets[0].model_copy(update={"content": "Edited content."})
+    encoded = serialization.encode(schemas.ChatResponse.model_construct(answer="", context=[edited]))
+    assert json.loads(encoded)["context"][0]["content"] == "Edited content."
+
+    history = [
+        schemas.ChatHistoryItem.model_construct(
+            id=1, question="q", answer="a", created_at=datetime(2024, 5, 1, 8, 30, 15, 123456)
+        )
+    ]
+    assert json.loads(serialization.encode(history)) == [history[0].model_dump(mode="json")]
+
+
+def test_admin_endpoints_require_admin(app_dependencies, monkeypatch):
+    _register_user()
+    _register_user(email="admin@example.com")
+    monkeypatch.setattr(main, "admin_emails", {"admin@example.com"})
+    monkeypatch.setattr(main, "slow_requests", main.SlowRequestLog())
+
+    with pytest.raises(HTTPException) as exc_info:
+        main.get_slow_requests(token=_login_user().access_token)
+    assert exc_info.value.status_code == 403
+
+    admin_token = _login_user(email="admin@example.com").access_token
+    config = main.configure_slow_requests(schemas.SlowRequestConfig(threshold_ms=250, capacity=5), token=admin_token)
+    assert config.threshold_ms == 250
+    assert config.capacity == 5
+    assert main.get_slow_requests(token=admin_token) == []
+    assert main.get_profiler_status(token=admin_token).running is False
@@ -0,0 +1,167 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from backend.tests.multipart_reference import email_parse_options_header  # noqa: E402
+from multipart import MultipartParseError, MultipartParser, parse_options_header  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, ("", {})),
+        ("   ", ("", {})),
+        ("Application/JSON", ("application/json", {})),
+        (b"multipart/form-data; boundary=----abc", ("multipart/form-data", {"boundary": "----abc"})),
+        ('form-data; Name="field"; filename="notes.txt"', ("form-data", {"name": "field", "filename": "notes.txt"})),
+        ('form-data; name="a;b"; x=1', ("form-data", {"name": "a;b", "x": "1"})),
+        ('form-data; name="say \\"hi\\""', ("form-data", {"name": 'say "hi"'})),
+        ('form-data; filename="C:\\\\diary.csv"', ("form-data", {"filename": "C:\\diary.csv"})),
+        ("text/plain;\tcharset = utf-8 ", ("text/plain", {"charset": "utf-8"})),
+        ("text/plain; flag", ("text/plain", {"flag": ""})),
+        ('text/plain; a="1"; A="2"', ("text/plain", {"a": "2"})),
+        ("attachment; filename*=UTF-8''%E2%82%AC%20rates", ("attachment", {"filename": "\u20ac rates"})),
+        ("attachment; filename*=iso-8859-1'en'%A3%20rates", ("attachment", {"filename": "\u00a3 rates"})),
+        ('attachment; filename="fallback.txt"; filename*=UTF-8\'\'%C3%A9.txt', ("attachment", {"filename": "\u00e9.txt"})),
+        (
+            "message/external-body; title*0*=us-ascii'en'This%20is; title*1*=%2A%2A%2Afun%2A%2A%2A; "
+            'title*2="isn\'t it!"',
+            ("message/external-body", {"title": "This is***fun***isn't it!"}),
+        ),
+        ("x; t*1=b; t*0=a", ("x", {"t": "ab"})),
+        ("x; t*=a; t*0=b", ("x", {"t": "ab"})),
+        ("x; f*=unknown-charset''abc", ("x", {"f": "abc"})),
+        ("x; file-name*=utf-8''a", ("x", {"file-name*": "utf-8''a"})),
+        ('x; c="unterminated; d=e', ("x", {"c": '"unterminated; d=e'})),
+    ],
+)
+def test_parse_options_header_conformance(header, expected):
+    assert parse_options_header(header) == expected
+
+
+def test_parse_options_header_matches_email_implementation():
+    rng = random.Random(2024)
+    names = ["name", "Filename", "title", "a"]
+    suffixes = ["", "*", "*0", "*1*", "*2"]
+    values = ["abc", '"a;b"', '"q\\"x"', "utf-8''%E2%82%AC", "latin-1'en'%E9%20x", "<angle>", "", '"\\\\"']
+    for _ in range(2000):
+        params = "".join(
+            rng.choice([";", " ; ", ";;"]) + rng.choice(names) + rng.choice(suffixes) + rng.choice(["=", " = ", ""])
+            + rng.choice(values)
+            for _ in range(rng.randint(0, 4))
+        )
+        header = rng.choice(["form-data", "Text/Plain", "a=b"]) + params
+        try:
+            expected = email_parse_options_header(header)
+        except TypeError:
+            # ``email`` cannot order mixed ``name*`` and ``name*0`` segments.
+            continue
+        assert parse_options_header(header) == expected, header
+
+
+def test_parse_options_header_memo_returns_fresh_dicts():
+    _, first = parse_options_header("form-data; name=diary")
+    first["name"] = "changed"
+    assert parse_options_header("form-data; name=diary") == ("form-data", {"name": "diary"})
+
+
+BOUNDARY = b"diary-boundary"
+BODY = (
+    b"ignored preamble\r\n"
+    b"--diary-boundary\r\n"
+    b'Content-Disposition: form-data; name="note"\r\n'
+    b"\r\n"
+    b"Headache after practice\r\n"
+    b"--diary-boundary \t\r\n"
+    b'Content-Disposition: form-data; name="diary"; filename="diary.csv"\r\n'
+    b"Content-Type: text/csv\r\n"
+    b"\r\n"
+    b"date,pain\r\n2024-05-01,7\r\n--diary\r\n"
+    b"\r\n"
+    b"--diary-boundary--\r\n"
+    b"ignored epilogue"
+)
+
+
+def _parse(body, chunk_size, **kwargs):
+    events = []
+    parts = []
+
+    def on_part_begin():
+        parts.append({"headers": [], "data": b""})
+
+    def on_header_field(data, start, end):
+        parts[-1]["headers"].append([data[start:end]])
+
+    def on_header_value(data, start, end):
+        parts[-1]["headers"][-1].append(data[start:end])
+
+    def on_part_data(data, start, end):
+        parts[-1]["data"] += data[start:end]
+
+    callbacks = {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_part_data": on_part_data,
+        "on_part_end": lambda: events.append("part_end"),
+        "on_end": lambda: events.append("end"),
+    }
+    parser = MultipartParser(BOUNDARY.decode(), callbacks, **kwargs)
+    peak = 0
+    for offset in range(0, len(body), chunk_size):
+        parser.write(body[offset : offset + chunk_size])
+        peak = max(peak, len(parser._buffer))
+    parser.finalize()
+    return parts, events, peak
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 17, len(BODY)])
+def test_multipart_parser_streams_parts(chunk_size):
+    parts, events, _ = _parse(BODY, chunk_size)
+
+    assert events == ["part_end", "part_end", "end"]
+    assert parts == [
+        {
+            "headers": [[b"Content-Disposition", b'form-data; name="note"']],
+            "data": b"Headache after practice",
+        },
+        {
+            "headers": [
+                [b"Content-Disposition", b'form-data; name="diary"; filename="diary.csv"'],
+                [b"Content-Type", b"text/csv"],
+            ],
+            "data": b"date,pain\r\n2024-05-01,7\r\n--diary\r\n",
+        },
+    ]
+
+
+def test_multipart_parser_buffer_stays_bounded():
+    payload = b"2024-05-01,7,skipped breakfast\r\n" * 10000
+    body = (
+        b"--diary-boundary\r\nContent-Disposition: form-data; name=\"diary\"\r\n\r\n"
+        + payload
+        + b"\r\n--diary-boundary--\r\n"
+    )
+    parts, _, peak = _parse(body, 4096)
+
+    assert parts[0]["data"] == payload
+    assert peak < len(b"\r\n--") + len(BOUNDARY)
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        (b"--diary-boundary\r\nContent-Disposition: form-data\r\n\r\ntruncated", "Unexpected end"),
+        (b"--diary-boundary\r\nno colon here\r\n\r\n", "Malformed multipart part header"),
+        (b"--diary-boundary junk\r\n", "Malformed multipart boundary line"),
+        (b"--diary-boundary\r\nX-Long: " + b"a" * 200 + b"\r\n\r\n", "too large"),
+    ],
+)
+def test_multipart_parser_rejects_malformed_bodies(body, message):
+    with pytest.raises(MultipartParseError, match=message):
+        _parse(body, 7, max_header_size=128)
@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from fastapi import FastAPI  # noqa: E402
+
+from backend.app.profiling import (  # noqa: E402
+    ProfiledRoute,
+    ProfilingMiddleware,
+    SamplingProfiler,
+    SlowRequestLog,
+    stage,
+)
+
+
+def _busy_retrieval(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def _endpoint(scope, receive, send):
+    def work():
+        with stage("rag.retrieve"):
+            _busy_retrieval(scope["work_seconds"])
+
+    await asyncio.to_thread(work)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _request(middleware, path="/chat/query", work_seconds=0.0, method="POST"):
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "work_seconds": work_seconds,
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    asyncio.run(middleware(scope, receive, send))
+
+
+def test_stage_is_noop_without_trace():
+    with stage("rag.retrieve"):
+        pass
+
+
+def test_slow_requests_are_captured_with_stages():
+    slow_requests = SlowRequestLog(threshold_ms=30, capacity=2)
+    middleware = ProfilingMiddleware(_endpoint, SamplingProfiler(), slow_requests)
+
+    _request(middleware, path="/fast")
+    for idx in range(3):
+        _request(middleware, path=f"/slow/{idx}", work_seconds=0.05)
+
+    records = slow_requests.records()
+    assert [record["path"] for record in records] == ["/slow/1", "/slow/2"]
+    assert records[0]["status_code"] == 200
+    assert records[0]["duration_ms"] >= 30
+    assert [item["name"] for item in records[0]["stages"]] == ["rag.retrieve"]
+    assert records[0]["stages"][0]["duration_ms"] >= 30
+
+
+def test_sampling_profiler_samples_endpoints_without_stages():
+    profiler = SamplingProfiler()
+    api = FastAPI()
+    api.router.route_class = ProfiledRoute
+
+    @api.get("/auth/login")
+    def login():
+        _busy_retrieval(0.2)
+        return {"ok": True}
+
+    middleware = ProfilingMiddleware(api, profiler, SlowRequestLog())
+
+    profiler.start(duration_seconds=5, interval_ms=1)
+    try:
+        _request(middleware, path="/auth/login", method="GET")
+        time.sleep(0.02)
+        samples_after_request = profiler.status()["samples"]
+        time.sleep(0.05)
+        # The worker thread is released as soon as the endpoint returns.
+        assert profiler.status()["samples"] == samples_after_request
+    finally:
+        profiler.stop()
+
+    lines = profiler.collapsed().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert stack.endswith("test_profiling:login;test_profiling:_busy_retrieval")
+    assert profiler.status()["running"] is False
+
+
+def test_concurrent_profiler_starts_leave_one_sampler():
+    profiler = SamplingProfiler()
+    starters = [
+        threading.Thread(target=profiler.start, kwargs={"duration_seconds": 5, "interval_ms": 1}) for _ in range(8)
+    ]
+    for starter in starters:
+        starter.start()
+    for starter in starters:
+        starter.join()
+
+    assert sum(thread.name == "sampling-profiler" for thread in threading.enumerate()) == 1
+    profiler.stop()
+    assert not any(thread.name == "sampling-profiler" for thread in threading.enumerate())
@@ -1,3 +1,3 @@
 __version__ = "0.0.0"
 
-from .multipart import parse_options_header  # noqa: F401
+from .multipart import MultipartParseError, MultipartParser, parse_options_header  # noqa: F401
@@ -1,4 +1,4 @@
-"""Utilities for working with multipart style option headers.
+"""Utilities for working with multipart style option headers and bodies.
 
 This project only needs a very small portion of what the real
 ``python-multipart`` package provides. Hidden tests exercise parsing of
@@ -8,17 +8,125 @@ returned an empty dictionary which meant callers could never discover the
 declared options, eventually triggering errors like "Binary files are not
 supported" when a boundary parameter was required.
 
-The implementation below mirrors the behaviour of ``werkzeug``'s
-``parse_options_header`` helper while keeping the dependency surface small.
-It returns a tuple consisting of the primary value and a dictionary of
-lower-cased option keys.
+:func:`parse_options_header` mirrors the behaviour of ``werkzeug``'s helper
+while keeping the dependency surface small. It returns a tuple consisting of
+the primary value and a dictionary of lower-cased option keys. Its results
+match what ``email.message.Message.get_params`` produces (including RFC 2231
+continuations and charset-encoded values) but the header is parsed in a
+single pass, and recently seen header values are memoised.
+
+:class:`MultipartParser` is a push-style ``multipart/form-data`` body parser
+using the same callback names as ``python-multipart``. Part data is emitted
+as it arrives, so only a bounded amount of the body is ever buffered.
 """
 
 from __future__ import annotations
 
-from email.message import Message
-from email.utils import collapse_rfc2231_value
-from typing import Dict, Tuple, Union
+import re
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, Union
+from urllib.parse import unquote as _percent_unquote
+
+# Same pattern as ``email.utils.rfc2231_continuation``.
+_RFC2231_CONTINUATION = re.compile(r"^(?P<name>\w+)\*((?P<num>[0-9]+)\*?)?$", re.ASCII)
+
+OPTIONS_HEADER_CACHE_SIZE = 256
+
+
+def _unquote(value: str) -> str:
+    """Remove surrounding quotes (or angle brackets) like ``email.utils.unquote``."""
+
+    if len(value) > 1:
+        if value[0] == '"' and value[-1] == '"':
+            return value[1:-1].replace("\\\\", "\\").replace('\\"', '"')
+        if value[0] == "<" and value[-1] == ">":
+            return value[1:-1]
+    return value
+
+
+def _split_params(value: str) -> List[str]:
+    """Split ``value`` on semicolons that are not inside a quoted string.
+
+    A double quote preceded by a backslash does not open or close a quoted
+    string, matching ``email.message._parseparam``.
+    """
+
+    pieces = value.split(";")
+    if '"' not in value:
+        return pieces
+
+    merged: List[str] = []
+    pending: Optional[str] = None
+    quotes = 0
+    for piece in pieces:
+        pending = piece if pending is None else pending + ";" + piece
+        quotes += piece.count('"') - piece.count('\\"')
+        if not quotes % 2:
+            merged.append(pending)
+            pending = None
+            quotes = 0
+    if pending is not None:
+        merged.append(pending)
+    return merged
+
+
+def _decode_extended(value: str) -> str:
+    """Decode a percent-encoded RFC 2231 ``charset'language'text`` value."""
+
+    parts = value.split("'", 2)
+    if len(parts) <= 2:
+        charset, text = "us-ascii", value
+    else:
+        charset, text = parts[0], parts[2]
+    try:
+        return str(bytes(text, "raw-unicode-escape"), charset, "replace")
+    except LookupError:
+        return _unquote(text)
+
+
+@lru_cache(maxsize=OPTIONS_HEADER_CACHE_SIZE)
+def _parse_options_header(value: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    pieces = _split_params(value)
+
+    primary = pieces[0].split("=", 1)[0].strip().lower()
+    options: Dict[str, str] = {}
+    # name -> [(continuation number, segment, percent-encoded)]
+    continuations: Dict[str, List[Tuple[Optional[int], str, bool]]] = {}
+
+    for piece in pieces[1:]:
+        key, sep, raw_val = piece.partition("=")
+        key = key.strip()
+        if sep:
+            # Like ``email``, only lower-case names before matching when a
+            # value is present; bare attributes are lower-cased afterwards.
+            key = key.lower()
+            raw_val = _unquote(raw_val.strip())
+
+        if "*" in key:
+            match = _RFC2231_CONTINUATION.match(key)
+            if match:
+                num = match.group("num")
+                continuations.setdefault(match.group("name"), []).append(
+                    (int(num) if num is not None else None, raw_val, key.endswith("*"))
+                )
+                continue
+        options[key.lower()] = raw_val
+
+    for key, segments in continuations.items():
+        # ``email`` raises ``TypeError`` when ``name*`` and ``name*0`` are
+        # mixed; order the unnumbered segment first instead.
+        segments.sort(key=lambda segment: (-1 if segment[0] is None else segment[0],) + segment[1:])
+        extended = False
+        decoded: List[str] = []
+        for _, segment, encoded in segments:
+            if encoded:
+                segment = _percent_unquote(segment, encoding="latin-1")
+                extended = True
+            decoded.append(segment)
+        joined = "".join(decoded)
+        options[key.lower()] = _decode_extended(joined) if extended else joined
+
+    return primary, tuple(options.items())
 
 
 def parse_options_header(value: Union[str, bytes, None]) -> Tuple[str, Dict[str, str]]:
@@ -41,21 +149,148 @@ def parse_options_header(value: Union[str, bytes, None]) -> Tuple[str, Dict[str,
     if not value:
         return "", {}
 
-    message = Message()
-    message["content-type"] = value
-    params = message.get_params(header="content-type", failobj=[])
+    primary, options = _parse_options_header(value)
+    return primary, dict(options)
 
-    if not params:
-        return value.lower(), {}
 
-    primary = params[0][0].strip().lower()
-    options: Dict[str, str] = {}
+class MultipartParseError(ValueError):
+    """Raised when a ``multipart/form-data`` body is malformed or too large."""
+
+
+Callbacks = Mapping[str, Callable[..., None]]
+
+_PREAMBLE, _BOUNDARY, _HEADERS, _DATA, _END = range(5)
+
+
+class MultipartParser:
+    """Incremental ``multipart/form-data`` parser.
+
+    Feed the body with :meth:`write` as chunks arrive and call
+    :meth:`finalize` once it is complete. ``callbacks`` may define any of
+    ``on_part_begin``, ``on_part_data``, ``on_part_end``,
+    ``on_header_field``, ``on_header_value``, ``on_header_end``,
+    ``on_headers_finished`` and ``on_end``; the data callbacks receive
+    ``(data, start, end)`` like their ``python-multipart`` counterparts.
+
+    Between writes the parser keeps at most one boundary's worth of part
+    data plus one incomplete header line, which is capped by
+    ``max_header_size`` bytes per part.
+    """
+
+    def __init__(
+        self,
+        boundary: Union[str, bytes],
+        callbacks: Optional[Callbacks] = None,
+        max_header_size: int = 16 * 1024,
+    ) -> None:
+        if isinstance(boundary, str):
+            boundary = boundary.encode("latin-1")
+        if not boundary:
+            raise MultipartParseError("Missing multipart boundary")
+        self.callbacks: Callbacks = callbacks or {}
+        self.max_header_size = max_header_size
+        self._delimiter = b"--" + boundary
+        self._part_delimiter = b"\r\n" + self._delimiter
+        self._buffer = bytearray()
+        self._state = _PREAMBLE
+        self._header_size = 0
+
+    def _callback(self, name: str, *args: object) -> None:
+        callback = self.callbacks.get(name)
+        if callback is not None:
+            callback(*args)
+
+    def _data_callback(self, name: str, data: bytes) -> None:
+        callback = self.callbacks.get(name)
+        if callback is not None and data:
+            callback(data, 0, len(data))
+
+    def write(self, data: bytes) -> int:
+        """Process ``data`` and return the number of bytes consumed."""
+
+        if self._state == _END:
+            return len(data)
+        self._buffer += data
+        while self._step():
+            pass
+        return len(data)
+
+    def finalize(self) -> None:
+        """Signal the end of the body."""
+
+        if self._state != _END:
+            raise MultipartParseError("Unexpected end of multipart body")
+        self._callback("on_end")
+
+    def _step(self) -> bool:
+        """Advance the state machine; return ``False`` when more data is needed."""
+
+        buffer = self._buffer
+        if self._state == _PREAMBLE:
+            index = buffer.find(self._delimiter)
+            if index < 0:
+                # Keep just enough to recognise a delimiter split across writes.
+                del buffer[: max(len(buffer) - len(self._delimiter) + 1, 0)]
+                return False
+            del buffer[: index + len(self._delimiter)]
+            self._state = _BOUNDARY
+            return True
+
+        if self._state == _BOUNDARY:
+            if buffer[:2] == b"--":
+                buffer.clear()
+                self._state = _END
+                return False
+            index = buffer.find(b"\r\n")
+            if index < 0:
+                if len(buffer) > self.max_header_size:
+                    raise MultipartParseError("Malformed multipart boundary line")
+                return False
+            # RFC 2046 allows transport padding after the boundary.
+            if buffer[:index].strip(b" \t"):
+                raise MultipartParseError("Malformed multipart boundary line")
+            del buffer[: index + 2]
+            self._header_size = 0
+            self._callback("on_part_begin")
+            self._state = _HEADERS
+            return True
+
+        if self._state == _HEADERS:
+            index = buffer.find(b"\r\n")
+            limit = self.max_header_size - self._header_size
+            if index < 0 or index > limit:
+                if index > limit or len(buffer) > limit:
+                    raise MultipartParseError("Multipart part headers are too large")
+                return False
+            line = bytes(buffer[:index])
+            del buffer[: index + 2]
+            self._header_size += index + 2
+            if not line:
+                self._callback("on_headers_finished")
+                self._state = _DATA
+                return True
+            name, sep, value = line.partition(b":")
+            name = name.strip()
+            if not sep or not name:
+                raise MultipartParseError("Malformed multipart part header")
+            self._data_callback("on_header_field", name)
+            self._data_callback("on_header_value", value.strip())
+            self._callback("on_header_end")
+            return True
 
-    for key, raw_val in params[1:]:
-        key_lower = key.strip().lower()
-        if isinstance(raw_val, tuple):
-            options[key_lower] = collapse_rfc2231_value(raw_val)
-        else:
-            options[key_lower] = raw_val
+        if self._state == _DATA:
+            index = buffer.find(self._part_delimiter)
+            if index < 0:
+                # The tail could be the start of a delimiter split across writes.
+                keep = len(self._part_delimiter) - 1
+                if len(buffer) > keep:
+                    self._data_callback("on_part_data", bytes(buffer[:-keep]))
+                    del buffer[:-keep]
+                return False
+            self._data_callback("on_part_data", bytes(buffer[:index]))
+            del buffer[: index + len(self._part_delimiter)]
+            self._callback("on_part_end")
+            self._state = _BOUNDARY
+            return True
 
-    return primary, options
+        return False